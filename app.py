@@ -1,6 +1,12 @@
+import os
+import re
+import tempfile
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import streamlit as st
-import plotly.express as px
+import plotly.graph_objects as go
 
 # -----------------------------
 # Config
@@ -148,86 +154,109 @@ MULTI_SELECT = {
     "What most often causes you to stop engaging with self-development tools?",
 }
 
+# Same answers as sets, for the sidebar check for unexpected values (bulk bucketing goes through pandas)
+ALLOWED_SETS = {col: frozenset(answers) for col, answers in ALLOWED.items()}
+
 OTHER_LABEL = "other"
 
+# Column type for every loaded survey column, whether it came from Excel or the Parquet copy.
+# Arrow-backed strings: less memory and vectorized .str/.isin kernels
+ARROW_STRING = pd.ArrowDtype(pa.large_string())
+
+# Frustration themes, checked in order; a response goes to the first theme with a matching keyword
+FRUSTRATION_THEMES = {
+    "Time constraints": ["time", "busy", "schedule", "hours", "workload", "overwhelmed", "no time", "don't have time", "lack of time"],
+    "Lack of feedback/guidance": ["feedback", "guidance", "mentor", "coach", "direction", "advice", "support", "help", "don't know how", "unsure how"],
+    "Cost/money": ["cost", "expensive", "money", "price", "afford", "budget", "financial", "pay", "paid"],
+    "Not seeing progress/results": ["progress", "results", "improvement", "change", "see results", "measurable", "outcomes", "impact"],
+    "Lack of accountability/motivation": ["accountability", "motivation", "discipline", "consistency", "stick with", "follow through", "commitment"],
+    "Content not relevant/applicable": ["relevant", "applicable", "practical", "real-world", "useful", "actionable", "relatable"],
+    "Information overload/too much": ["overwhelming", "too much", "information overload", "complex", "complicated", "confusing"],
+    "Lack of resources/tools": ["resources", "tools", "access", "available", "options", "programs", "platforms"],
+    "Organizational/systemic barriers": ["company", "organization", "employer", "system", "culture", "politics", "structure", "management"],
+    "Self-doubt/confidence": ["confidence", "self-doubt", "imposter", "worthy", "capable", "qualified", "deserve"],
+}
+
+# One compiled alternation per theme, so each theme is a single regex scan
+FRUSTRATION_THEME_PATTERNS = {
+    theme: re.compile("|".join(re.escape(k) for k in keywords))
+    for theme, keywords in FRUSTRATION_THEMES.items()
+}
+
 
 # -----------------------------
 # Helpers
 # -----------------------------
-def bucket_value(value: str, allowed: list[str]) -> str:
-    # Handle NaN, None, and empty values
-    if pd.isna(value) or value is None:
-        return ""
-    v = str(value).strip()
-    if not v:
-        return ""
-    return v if v in allowed else OTHER_LABEL
-
-
 def explode_multiselect(series: pd.Series, allowed: list[str]) -> pd.Series:
     # split on commas, trim, bucket unknowns to OTHER_LABEL
-    items = []
-    for raw in series.dropna().astype(str):
-        parts = [p.strip() for p in raw.split(",") if p.strip()]
-        if not parts:
-            continue
-        for p in parts:
-            items.append(bucket_value(p, allowed))
-    return pd.Series([i for i in items if i])
-
+    # each item keeps the index of the row it came from so it can be filtered later
+    s = series.dropna().astype("string").str.split(",").explode().str.strip()
+    s = s[s.notna() & (s != "")]
+    return s.where(s.isin(allowed), OTHER_LABEL) if allowed else s
+
+
+def bucket_single_select(series: pd.Series, allowed: list[str]) -> pd.Series:
+    # Strip every non-NaN value as a string, so "n/a", "0", etc. are captured.
+    # Anything outside the allowed answers is bucketed to OTHER_LABEL before
+    # building the Categorical, so every value is one of its categories.
+    s = series.dropna().astype("string").str.strip()
+    s = s[s != ""]
+    s = s.where(s.isin(allowed), OTHER_LABEL)
+    cat = pd.Categorical(s, categories=allowed + [OTHER_LABEL])
+    return pd.Series(cat, index=s.index)
+
+
+def frequency_from_counts(counts: pd.Series) -> dict[str, np.ndarray]:
+    # Categorical counts include every category, even unused ones
+    counts = counts[counts > 0]
+    total = counts.sum()
+    percentages = (counts / total * 100).round(1) if total > 0 else counts * 0
+    # plain arrays, handed straight to go.Bar without a DataFrame round-trip
+    out = {
+        "answer": counts.index.astype(str).to_numpy(),
+        "count": counts.to_numpy(dtype="int64"),
+        "percentage": percentages.to_numpy(dtype="float64"),
+    }
+    return out
 
-def frequency_for_question(df: pd.DataFrame, col: str) -> pd.DataFrame:
-    allowed = ALLOWED.get(col, None)
 
-    if col in MULTI_SELECT:
-        if allowed is None:
-            # if not specified, just count raw options
-            s = explode_multiselect(df[col], allowed=[])
+@st.cache_data(show_spinner=False)
+def question_frequencies(
+    filter_key: tuple, _df: pd.DataFrame, _answers: pd.DataFrame
+) -> dict[str, dict[str, np.ndarray]]:
+    # Frequencies for every preprocessed question from one groupby over the
+    # filtered rows. Cached per filter_key; _df and _answers are skipped by the
+    # hasher, so filter_key has to identify the filtered rows on its own.
+    answers = _answers[_answers["row"].isin(_df.index)]
+    counts = answers.groupby(["question", "answer"], observed=True, sort=False).size()
+
+    questions = _answers["question"].cat.categories
+    freqs = {col: frequency_from_counts(pd.Series(dtype="int64")) for col in questions}
+    for col, col_counts in counts.groupby(level="question", observed=True, sort=False):
+        col_counts = col_counts.droplevel("question")
+        allowed = ALLOWED.get(col, None)
+        if allowed:
+            # chart answers in their canonical order so bars don't jump around between filters
+            col_counts = col_counts.reindex(allowed + [OTHER_LABEL], fill_value=0)
         else:
-            s = explode_multiselect(df[col], allowed=allowed)
-        counts = s.value_counts(dropna=True)
-        total = counts.sum()
-        percentages = (counts / total * 100).round(1) if total > 0 else counts * 0
-        out = pd.DataFrame({
-            "answer": counts.index,
-            "count": counts.values,
-            "percentage": percentages.values
-        })
-        return out
-
-    # single-select / free-text
-    s = df[col]
-    if allowed is not None:
-        # Process all non-NaN values - bucket_value handles empty/None cases
-        # This ensures "n/a", "0", and other string values are captured
-        s = s.apply(lambda v: bucket_value(v, allowed) if pd.notna(v) else "")
-        s = s[s != ""]
-    else:
-        # Convert to string and filter out empty values
-        s = s.apply(lambda v: str(v).strip() if pd.notna(v) else "")
-        s = s[s != ""]
+            col_counts = col_counts.sort_values(ascending=False, kind="stable")
+        freqs[col] = frequency_from_counts(col_counts)
+    return freqs
 
-    counts = s.value_counts(dropna=True)
-    total = counts.sum()
-    percentages = (counts / total * 100).round(1) if total > 0 else counts * 0
-    out = pd.DataFrame({
-        "answer": counts.index,
-        "count": counts.values,
-        "percentage": percentages.values
-    })
-    return out
+
+@st.cache_data(show_spinner=False)
+def frequency_for_question(filter_key: tuple, col: str, _df: pd.DataFrame) -> dict[str, np.ndarray]:
+    # Free-text questions that have no preprocessed answers; cached per (filter_key, col).
+    # Convert to string and filter out empty values
+    s = _df[col].dropna().astype("string").str.strip()
+    s = s[s != ""]
+    return frequency_from_counts(s.value_counts(dropna=True))
 
 
 def get_all_responses(df: pd.DataFrame, col: str) -> list[str]:
     """Extract all non-empty responses for a question."""
-    responses = []
-    for value in df[col].dropna():
-        if pd.isna(value) or value is None:
-            continue
-        v = str(value).strip()
-        if v:
-            responses.append(v)
-    return responses
+    s = df[col].dropna().astype("string").str.strip()
+    return s[s != ""].tolist()
 
 
 def create_themes_for_frustrations(responses: list[str]) -> dict[str, list[str]]:
@@ -235,31 +264,18 @@ def create_themes_for_frustrations(responses: list[str]) -> dict[str, list[str]]
     if not responses:
         return {}
     
-    # Define theme keywords based on common leadership development frustrations
-    themes = {
-        "Time constraints": ["time", "busy", "schedule", "hours", "workload", "overwhelmed", "no time", "don't have time", "lack of time"],
-        "Lack of feedback/guidance": ["feedback", "guidance", "mentor", "coach", "direction", "advice", "support", "help", "don't know how", "unsure how"],
-        "Cost/money": ["cost", "expensive", "money", "price", "afford", "budget", "financial", "pay", "paid"],
-        "Not seeing progress/results": ["progress", "results", "improvement", "change", "see results", "measurable", "outcomes", "impact"],
-        "Lack of accountability/motivation": ["accountability", "motivation", "discipline", "consistency", "stick with", "follow through", "commitment"],
-        "Content not relevant/applicable": ["relevant", "applicable", "practical", "real-world", "useful", "actionable", "relatable"],
-        "Information overload/too much": ["overwhelming", "too much", "information overload", "complex", "complicated", "confusing"],
-        "Lack of resources/tools": ["resources", "tools", "access", "available", "options", "programs", "platforms"],
-        "Organizational/systemic barriers": ["company", "organization", "employer", "system", "culture", "politics", "structure", "management"],
-        "Self-doubt/confidence": ["confidence", "self-doubt", "imposter", "worthy", "capable", "qualified", "deserve"],
-    }
-    
     # Categorize responses
-    categorized = {theme: [] for theme in themes.keys()}
+    categorized = {theme: [] for theme in FRUSTRATION_THEMES.keys()}
     uncategorized = []
     
-    for response in responses:
-        response_lower = response.lower()
+    # Lowercase everything in one pass up front, then match against the lowered copy
+    lowered = [r.lower() for r in responses]
+    for response, response_lower in zip(responses, lowered):
         categorized_flag = False
         
         # Check each theme's keywords
-        for theme, keywords in themes.items():
-            if any(keyword in response_lower for keyword in keywords):
+        for theme, pattern in FRUSTRATION_THEME_PATTERNS.items():
+            if pattern.search(response_lower):
                 categorized[theme].append(response)
                 categorized_flag = True
                 break
@@ -275,26 +291,41 @@ def create_themes_for_frustrations(responses: list[str]) -> dict[str, list[str]]
     return result
 
 
-def apply_demographic_filters(df: pd.DataFrame) -> pd.DataFrame:
-    st.sidebar.header("Filters (Demographics)")
-    filtered = df.copy()
-
+@st.cache_data(show_spinner=False)
+def demographic_options(df: pd.DataFrame) -> dict[str, list[str]]:
+    # Sidebar options per demographic, computed once from the unfiltered data
+    options_by_col = {}
     for col in DEMOGRAPHIC_COLS:
-        if col not in filtered.columns:
+        if col not in df.columns:
             continue
 
         allowed = ALLOWED.get(col, None)
-        options = sorted([o for o in filtered[col].dropna().unique().astype(str)])
+        options = sorted(df[col].dropna().astype("string").unique().tolist())
         if allowed:
             # keep the allowed order, append any weird values so user can still filter them
-            weird = [o for o in options if o not in allowed]
+            weird = [o for o in options if o not in ALLOWED_SETS[col]]
             options = allowed + sorted(weird)
+        options_by_col[col] = options
+    return options_by_col
+
+
+def apply_demographic_filters(df: pd.DataFrame) -> tuple[pd.DataFrame, tuple]:
+    # Returns the filtered frame plus a hashable key describing the selection,
+    # used to cache per-question results across reruns.
+    st.sidebar.header("Filters (Demographics)")
+    # AND every selection into one row mask and slice the frame once at the end
+    mask = pd.Series(True, index=df.index)
+    filter_key = []
 
+    for col, options in demographic_options(df).items():
         selected = st.sidebar.multiselect(col, options=options, default=[])
+        filter_key.append((col, tuple(sorted(selected))))
         if selected:
-            filtered = filtered[filtered[col].astype(str).isin(selected)]
+            mask &= df[col].isin(selected)
 
-    return filtered
+    # no selection narrows anything down: hand back the frame itself, no copy
+    filtered = df if mask.all() else df[mask]
+    return filtered, tuple(filter_key)
 
 
 # -----------------------------
@@ -305,19 +336,68 @@ st.title("Core15 Survey Results")
 
 @st.cache_data
 def load_data(path: str) -> pd.DataFrame:
+    # Parsing the Excel file is slow, so keep a Parquet copy next to it and
+    # only re-read the Excel file when it is newer than that copy.
+    parquet_path = os.path.splitext(path)[0] + ".parquet"
+    if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(path):
+        try:
+            return pd.read_parquet(parquet_path, dtype_backend="pyarrow").astype(ARROW_STRING)
+        except Exception:
+            # unreadable copy (e.g. corrupted), fall through and rebuild it from Excel
+            pass
+
     # Read Excel without converting "n/a" to NaN - preserve all string values
     # keep_default_na=False prevents pandas from auto-converting "n/a", "N/A", etc. to NaN
     df = pd.read_excel(path, keep_default_na=False)
-    return df
+    # Answers like "0" come back as numbers mixed in with text; store everything as strings
+    df = df.astype(str)
+    # Write to a temp file and swap it in, so an interrupted write never leaves
+    # a truncated copy behind
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(suffix=".parquet", dir=os.path.dirname(parquet_path) or ".")
+        os.close(fd)
+        df.to_parquet(tmp_path, engine="pyarrow")
+        os.replace(tmp_path, parquet_path)
+    except OSError:
+        # read-only checkout, just skip the on-disk copy
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return df.astype(ARROW_STRING)
+
+@st.cache_data(show_spinner=False)
+def preprocess(df: pd.DataFrame) -> pd.DataFrame:
+    # Bucket every charted question with a known answer set once, as one long
+    # (question, row, answer) frame. Multi-selects are exploded (one item per row);
+    # the rest are bucketed to their allowed answers. "row" is the original row
+    # index so filtered subsets can be sliced out. Demographics are filters, not charts.
+    prepared = {}
+    for col in df.columns:
+        if col in DEMOGRAPHIC_COLS:
+            continue
+        allowed = ALLOWED.get(col, None)
+        if col in MULTI_SELECT:
+            # if not specified, just count raw options
+            prepared[col] = explode_multiselect(df[col], allowed=allowed or [])
+        elif allowed is not None:
+            prepared[col] = bucket_single_select(df[col], allowed)
+
+    answers = pd.concat(
+        {col: s.astype(str) for col, s in prepared.items()}, names=["question", "row"]
+    ).rename("answer").reset_index()
+    # categorical, so questions with no answers at all still show up in the categories
+    answers["question"] = pd.Categorical(answers["question"], categories=list(prepared))
+    return answers
 
 df = load_data(FILE_PATH)
+answers = preprocess(df)
 
 # Drop Prolific ID from visualization list, but keep it for record count integrity
 PROLIFIC_COL = "What is your Prolific ID?"
 if PROLIFIC_COL in df.columns:
     df[PROLIFIC_COL] = df[PROLIFIC_COL].astype(str)
 
-filtered = apply_demographic_filters(df)
+filtered, filter_key = apply_demographic_filters(df)
 
 st.subheader("Sample size")
 c1, c2 = st.columns(2)
@@ -333,10 +413,10 @@ question_cols = [c for c in df.columns if c != PROLIFIC_COL and c not in DEMOGRA
 
 FRUSTRATION_QUESTION = "What frustrates you most about trying to improve as a leader?"
 
-for col in question_cols:
-    if col not in filtered.columns:
-        continue
-
+def render_question(
+    col: str, filtered: pd.DataFrame, filter_key: tuple, freq: dict[str, np.ndarray] | None
+) -> None:
+    # freq is the question's slice of question_frequencies, or None if it has no preprocessed answers
     st.markdown(f"### {col}")
 
     # Special handling for the frustration question
@@ -374,15 +454,27 @@ for col in question_cols:
             st.info("No responses for this question in the filtered set.")
     else:
         # Normal display with bar chart for other questions
-        freq = frequency_for_question(filtered, col)
+        if freq is None:
+            freq = frequency_for_question(filter_key, col, filtered)
 
-        if freq.empty:
+        if len(freq["answer"]) == 0:
             st.info("No responses for this question in the filtered set.")
-            continue
-
-        fig = px.bar(freq, x="answer", y="percentage", custom_data=["count"])
-        fig.update_traces(
-            hovertemplate="<b>Percentage:</b> %{y}%<br><b>Count:</b> %{customdata[0]}<extra></extra>"
-        )
+            return
+
+        fig = go.Figure(go.Bar(
+            x=freq["answer"],
+            y=freq["percentage"],
+            customdata=freq["count"].reshape(-1, 1),
+            hovertemplate="<b>Percentage:</b> %{y}%<br><b>Count:</b> %{customdata[0]}<extra></extra>",
+        ))
         fig.update_layout(xaxis_title="", yaxis_title="Percentage (%)", bargap=0.2)
-        st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+        st.plotly_chart(fig, use_container_width=True)
+
+
+question_freqs = question_frequencies(filter_key, filtered, answers)
+
+for col in question_cols:
+    if col not in filtered.columns:
+        continue
+
+    render_question(col, filtered, filter_key, question_freqs.get(col))